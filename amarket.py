@@ -7,9 +7,8 @@ import re
 import time
 import random
 
-import requests
-
 import drops
+import transport
 
 
 class ParseException(Exception):
@@ -28,7 +27,7 @@ def get_items(nc=True, save=True):
         with open('market/items.json') as f:
             return json.load(f)
 
-    response = requests.get(ITEMS_URL)
+    response = transport.get(ITEMS_URL)
     items = response.json()
 
     if save:
@@ -66,7 +65,7 @@ def get_stats(item, nc_delta=timedelta(days=1), save=True):
 
     if latest_path is None or nc_delta is None or datetime.utcnow() - nc_delta > latest_time:
         save_time = datetime.utcnow()
-        response = requests.get(STATISTICS_URL_FORMAT.format(url_name))
+        response = transport.get(STATISTICS_URL_FORMAT.format(url_name))
         stats = response.json()
 
         time.sleep(0.5)
@@ -0,0 +1,41 @@
+from datetime import datetime
+import argparse
+import os
+
+from tabulate import tabulate
+
+import drops
+import market
+import relics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--low', type=float, default=0.05)
+    parser.add_argument('--high', type=float, default=0.95)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    items = market.get_items()
+    relic_data_by_location = relics.get_relic_data_by_location(drops.get_relics())
+    table = relics.get_relic_table(relic_data_by_location, items)
+
+    evs = relics.get_squad_evs(table)
+    bands = relics.get_ev_bands(table, args.samples, (args.low, 0.5, args.high), args.seed)
+
+    rows = [[location, ev] + band.tolist() for location, ev, band in zip(table['locations'], evs, bands)]
+    headers = ['Location', 'EV', 'P{:g}'.format(args.low * 100), 'P50', 'P{:g}'.format(args.high * 100)]
+
+    if not os.path.isdir('out/ev_bands'):
+        os.makedirs('out/ev_bands')
+
+    with open('out/ev_bands/{}.txt'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
+        for row in rows:
+            f.write('{} {:.2f} {:.2f} {:.2f} {:.2f}\n'.format(*row))
+
+    print(tabulate(rows, headers=headers, floatfmt='.2f'))
+
+
+if __name__ == '__main__':
+    main()
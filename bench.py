@@ -0,0 +1,282 @@
+from datetime import datetime
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from tabulate import tabulate
+
+
+# Recorded fixtures and the stored baseline live next to the code; results
+# go to out/bench in the data directory like the other outputs.
+REPO_PATH = os.path.dirname(os.path.abspath(__file__))
+
+FIXTURES_PATH = os.path.join(REPO_PATH, 'fixtures')
+
+BASELINE_PATH = os.path.join(FIXTURES_PATH, 'bench_baseline.json')
+
+
+def get_drop_items(relic_drops):
+    return sorted(set(
+        drop_item
+        for location, location_data in relic_drops
+        for drop_item, rate_str in location_data
+        if drop_item != 'Forma Blueprint'
+    ))
+
+
+def record(path=FIXTURES_PATH):
+    # Capture the droptables page, the items payload and the statistics of
+    # every relic drop. Items and statistics come from the market cache when
+    # it is fresh, as in a normal run.
+    from bs4 import BeautifulSoup
+
+    import drops
+    import market
+    import transport
+
+    response = transport.get(drops.DROPS_URL)
+
+    stats_path = os.path.join(path, 'statistics')
+    if not os.path.isdir(stats_path):
+        os.makedirs(stats_path)
+
+    with open(os.path.join(path, 'droptables.html'), 'wb') as f:
+        f.write(response.content)
+
+    items = market.get_items()
+    with open(os.path.join(path, 'items.json'), 'w') as f:
+        json.dump(items, f)
+
+    # The aliases used now are replayed by run, which never reads the ones
+    # in the data directory.
+    with open(os.path.join(path, 'aliases.json'), 'w') as f:
+        json.dump(market.get_aliases(), f, indent=2, sort_keys=True)
+
+    soup = BeautifulSoup(response.content, 'html.parser')
+    relic_drops = drops.parse_table_relics(drops.get_table(soup, 'relicRewards', 'relics'))
+
+    for drop_item in get_drop_items(relic_drops):
+        item = market.find_drop_item(items, drop_item)
+        if item is None:
+            print('Could not find drop_item {}'.format(drop_item))
+            continue
+
+        with open(os.path.join(stats_path, item['urlName'] + '.json'), 'w') as f:
+            json.dump(market.get_stats(item), f)
+
+
+def load_fixtures(path=FIXTURES_PATH):
+    with open(os.path.join(path, 'droptables.html'), 'rb') as f:
+        html = f.read()
+
+    with open(os.path.join(path, 'items.json')) as f:
+        items = json.load(f)
+
+    aliases = {}
+    aliases_path = os.path.join(path, 'aliases.json')
+    if os.path.isfile(aliases_path):
+        with open(aliases_path) as f:
+            aliases = json.load(f)
+
+    stats_by_url_name = {}
+    stats_path = os.path.join(path, 'statistics')
+    for filename in sorted(os.listdir(stats_path)):
+        with open(os.path.join(stats_path, filename)) as f:
+            stats_by_url_name[filename[:-len('.json')]] = json.load(f)
+
+    return html, items, stats_by_url_name, aliases
+
+
+def get_zero_stats():
+    # Statistics with a single median of 0, for items priced 0 in a run.
+    return {'payload': {'statistics_closed': {'90days': [{'datetime': '2000-01-01T00:00:00.000+00:00', 'median': 0}]}}}
+
+
+def time_function(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'repeat': repeat
+    }
+
+
+def run_process(args, cwd):
+    pythonpath = os.environ.get('PYTHONPATH')
+    env = dict(os.environ, PYTHONPATH=REPO_PATH + os.pathsep + pythonpath if pythonpath else REPO_PATH)
+    subprocess.run([sys.executable] + args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, check=True)
+
+
+def run(repeat=5, path=FIXTURES_PATH):
+    from bs4 import BeautifulSoup
+
+    import drops
+    import fmarket
+    import market
+    import relics
+
+    html, items, stats_by_url_name, aliases = load_fixtures(path)
+    market.aliases = aliases
+
+    results = {}
+
+    results['parse_html'] = time_function(lambda: BeautifulSoup(html, 'html.parser'), repeat)
+    soup = BeautifulSoup(html, 'html.parser')
+
+    missions_table = drops.get_table(soup, 'missionRewards', 'missions')
+    relics_table = drops.get_table(soup, 'relicRewards', 'relics')
+    results['parse_table_missions'] = time_function(lambda: drops.parse_table_missions(missions_table), repeat)
+    results['parse_table_relics'] = time_function(lambda: drops.parse_table_relics(relics_table), repeat)
+
+    relic_drops = drops.parse_table_relics(relics_table)
+    drop_items = get_drop_items(relic_drops)
+    results['find_drop_item'] = time_function(lambda: [market.find_drop_item(items, drop_item) for drop_item in drop_items], repeat)
+
+    all_stats = list(stats_by_url_name.values())
+    results['get_stats_price'] = time_function(lambda: [market.get_stats_price(stats) for stats in all_stats], repeat)
+
+    # Drops that did not resolve when recording get a stand-in item, so no
+    # name is ever sent to resolution or fetched.
+    item_by_drop_item = market.find_drop_items(market.get_item_index(items), drop_items)
+    items = list(items)
+    for drop_item in drop_items:
+        if item_by_drop_item[drop_item] is None:
+            url_name = 'bench_unresolved_{}'.format(len(items))
+            items.append({'id': url_name, 'slug': url_name, 'urlName': url_name, 'item_name': drop_item, 'i18n': {'en': {'name': drop_item}}})
+
+    # Prices come from the fixtures only. Items without recorded statistics
+    # are priced 0 so that nothing is fetched.
+    price_stats_by_url_name = {}
+    for drop_item in drop_items:
+        item = market.find_drop_item(items, drop_item)
+        stats = stats_by_url_name.get(item['urlName'])
+        if stats is None or market.get_stats_price(stats) is None:
+            stats = get_zero_stats()
+        price_stats_by_url_name[item['urlName']] = stats
+        market.price_by_url_name[item['urlName']] = market.get_stats_price(stats)
+
+    relic_data_by_location = relics.get_relic_data_by_location(relic_drops)
+    results['relic_table'] = time_function(lambda: relics.get_relic_table(relic_data_by_location, items), repeat)
+
+    # The per-location EV and Monte Carlo functions are what relics.py runs.
+    # The Monte Carlo one is timed on the first relic only since it costs
+    # trials * players rolls per location.
+    locations = list(relic_data_by_location)
+    results['single_player_ev'] = time_function(lambda: [relics.get_expected_value(relic_data_by_location, items, location) for location in locations], repeat)
+    results['multiplayer_ev'] = time_function(lambda: [relics.get_multiplayer_ev(relic_data_by_location, items, location) for location in locations[:4]], repeat)
+
+    table = relics.get_relic_table(relic_data_by_location, items)
+    results['single_player_ev_table'] = time_function(lambda: relics.get_squad_evs(table, 1), repeat)
+    results['multiplayer_ev_table'] = time_function(lambda: relics.get_squad_evs(table, 4), repeat)
+
+    # fmarket reads its tables from the data directory, so it runs inside a
+    # scratch one holding the fixture tables and fresh statistics caches.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_path:
+        os.makedirs(os.path.join(data_path, 'drops'))
+        os.makedirs(os.path.join(data_path, 'market'))
+        with open(os.path.join(data_path, 'drops', 'relics.json'), 'w') as f:
+            json.dump(relic_drops, f)
+        with open(os.path.join(data_path, 'market', 'items.json'), 'w') as f:
+            json.dump(items, f)
+        with open(os.path.join(data_path, 'market', 'aliases.json'), 'w') as f:
+            json.dump(aliases, f)
+
+        stats_filename = datetime.utcnow().strftime(market.FILENAME_TIME_FORMAT)
+        for url_name, stats in price_stats_by_url_name.items():
+            stats_path = os.path.join(data_path, 'market', 'items', url_name, 'statistics')
+            os.makedirs(stats_path)
+            with open(os.path.join(stats_path, stats_filename), 'w') as f:
+                json.dump(stats, f)
+
+        os.chdir(data_path)
+        try:
+            results['fmarket_load_state'] = time_function(fmarket.load_state, repeat)
+
+            state = fmarket.load_state()
+            request = {'relics': state['relic_names'][:10], 'refinements': True}
+            results['fmarket_query'] = time_function(lambda: fmarket.query(state, request), repeat)
+        finally:
+            os.chdir(cwd)
+
+        # Warm-cache startup of fresh processes. The first run builds the
+        # marshal copies of the cached tables; the goal for a warm query is
+        # under 100 ms end to end.
+        relic_type, relic_code = state['relic_names'][0].split(' ', 1)
+        fmarket_args = [os.path.join(REPO_PATH, 'fmarket.py'), relic_type[0] + relic_code, '--no-daemon']
+        run_process(fmarket_args, data_path)
+
+        results['import_fmarket'] = time_function(lambda: run_process(['-c', 'import fmarket'], data_path), repeat)
+        results['startup_fmarket'] = time_function(lambda: run_process(fmarket_args, data_path), repeat)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    rows = []
+    regressions = []
+
+    for name, result in results.items():
+        baseline_result = baseline.get(name)
+        if baseline_result is None:
+            rows.append([name, result['median'], None, None, ''])
+            continue
+
+        ratio = result['median'] / baseline_result['median']
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        rows.append([name, result['median'], baseline_result['median'], ratio, 'REGRESSION' if regressed else ''])
+
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record()
+        return
+
+    results = run(args.repeat)
+
+    baseline = {}
+    if os.path.isfile(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    rows, regressions = compare(results, baseline, args.threshold)
+
+    if not os.path.isdir('out/bench'):
+        os.makedirs('out/bench')
+
+    with open('out/bench/{}.json'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
+        json.dump({'results': results, 'threshold': args.threshold, 'regressions': regressions}, f, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print(tabulate(rows, headers=['Benchmark', 'Median (s)', 'Baseline (s)', 'Ratio', ''], floatfmt='.6f'))
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
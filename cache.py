@@ -0,0 +1,34 @@
+import json
+import marshal
+import os
+
+
+# The JSON cache files stay the source of truth. Next to each one a marshal
+# copy is kept, which loads several times faster than parsing the JSON and is
+# rebuilt whenever the JSON file is newer or the copy cannot be read (marshal
+# data is specific to the Python version).
+
+def get_marshal_path(path):
+    return path + '.marshal'
+
+
+def load_json(path):
+    marshal_path = get_marshal_path(path)
+
+    try:
+        if os.path.getmtime(marshal_path) >= os.path.getmtime(path):
+            with open(marshal_path, 'rb') as f:
+                return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    with open(path) as f:
+        data = json.load(f)
+
+    try:
+        with open(marshal_path, 'wb') as f:
+            marshal.dump(data, f)
+    except OSError:
+        pass
+
+    return data
@@ -2,8 +2,9 @@ import csv
 import json
 import os
 
-import requests
-from bs4 import BeautifulSoup
+import cache
+import metrics
+import transport
 
 
 DROPS_URL = 'https://www.warframe.com/droptables'
@@ -20,12 +21,26 @@ def get_soup():
     global soup
 
     if soup is None:
-        response = requests.get(DROPS_URL)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with metrics.span('http.droptables'):
+            response = transport.get(DROPS_URL)
+        with metrics.span('drops.parse_html'):
+            # bs4 is only needed when the cache is cold.
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(response.content, 'html.parser')
 
     return soup
 
 
+def get_table(soup, header_id, name):
+    header = soup.select_one('#' + header_id)
+    if header is None:
+        raise ParseException('Could not get {} header'.format(name))
+    table = header.next_sibling.next_sibling
+    if table.name != 'table':
+        raise ParseException('Could not get {} table'.format(name))
+    return table
+
+
 def parse_table_missions(table):
     rows = table.find_all('tr', recursive=False)
 
@@ -82,19 +97,14 @@ def parse_table_missions(table):
 
 def get_missions(nc=True, save=True):
     if nc and os.path.isfile('drops/missions.json'):
-        with open('drops/missions.json') as f:
-            return json.load(f)
+        metrics.cache_hit('drops')
+        return cache.load_json('drops/missions.json')
+    metrics.cache_miss('drops')
 
-    soup = get_soup()
+    table = get_table(get_soup(), 'missionRewards', 'missions')
 
-    header = soup.select_one('#missionRewards')
-    if header is None:
-        raise ParseException('Could not get missions header')
-    table = header.next_sibling.next_sibling
-    if table.name != 'table':
-        raise ParseException('Could not get missions table')
-
-    missions = parse_table_missions(table)
+    with metrics.span('drops.parse_table_missions'):
+        missions = parse_table_missions(table)
 
     if save:
         if not os.path.isdir('drops'):
@@ -156,19 +166,14 @@ def parse_table_relics(table):
 
 def get_relics(nc=True, save=True):
     if nc and os.path.isfile('drops/relics.json'):
-        with open('drops/relics.json') as f:
-            return json.load(f)
-
-    soup = get_soup()
+        metrics.cache_hit('drops')
+        return cache.load_json('drops/relics.json')
+    metrics.cache_miss('drops')
 
-    header = soup.select_one('#relicRewards')
-    if header is None:
-        raise ParseException('Could not get relics header')
-    table = header.next_sibling.next_sibling
-    if table.name != 'table':
-        raise ParseException('Could not get relics table')
+    table = get_table(get_soup(), 'relicRewards', 'relics')
 
-    relics = parse_table_relics(table)
+    with metrics.span('drops.parse_table_relics'):
+        relics = parse_table_relics(table)
 
     if save:
         if not os.path.isdir('drops'):
@@ -1,8 +1,12 @@
+import argparse
 import csv
 import json
+import os
+import re
 
-import requests
-from bs4 import BeautifulSoup
+import cache
+import metrics
+import transport
 
 
 MISSIONS_URL = 'https://docs.google.com/feeds/download/spreadsheets/Export?gid=0&key=1iyuQXUaWcIr1-DrYsFgsPsGuGANTwWDEK9Fy_fzFfLU&exportFormat=csv'
@@ -11,14 +15,297 @@ RELICS_URL = 'https://docs.google.com/feeds/download/spreadsheets/Export?gid=983
 
 KEYS_URL = 'https://docs.google.com/feeds/download/spreadsheets/Export?gid=2115252437&key=1iyuQXUaWcIr1-DrYsFgsPsGuGANTwWDEK9Fy_fzFfLU&exportFormat=csv'
 
+SHEET_URL_FORMAT = 'https://docs.google.com/feeds/download/spreadsheets/Export?gid={}&key=1iyuQXUaWcIr1-DrYsFgsPsGuGANTwWDEK9Fy_fzFfLU&exportFormat=csv'
+
 
 DYNAMIC_LOCATIONS_URL = 1677193611
 
+# Not ingested: bounty rewards are laid out by stage rather than by
+# location and rotation, and drops.py has no bounty tables to validate
+# them against.
 BOUNTIES_URL = 170803411
 
+# Raw excerpts of each sheet, recorded with --record-samples, so the layout
+# the parsers expect can be checked offline with --check-samples.
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sheets')
+
+# Rates as the droptables page writes them, e.g. "Rare (2.00%)".
+RATE_PATTERN = re.compile(r'^[A-Za-z ]+ \([0-9]*\.?[0-9]+%\)$')
+
 
 class ParseException(Exception):
     pass
 
 
-            
+def get_sheet_lines(url):
+    # Stream the CSV export line by line instead of loading the whole sheet.
+    with metrics.span('http.sheets'):
+        response = transport.get(url, stream=True)
+    if response.status_code != 200:
+        raise ParseException('Could not get sheet {}'.format(response.status_code))
+    response.encoding = 'utf-8'
+
+    return response.iter_lines(decode_unicode=True)
+
+
+def get_rows(lines):
+    for row in csv.reader(lines):
+        yield [cell.strip() for cell in row]
+
+
+def get_sheet_rows(url):
+    return get_rows(get_sheet_lines(url))
+
+
+def is_blank_row(row):
+    return not any(row)
+
+
+def is_header_row(row):
+    return bool(row) and row[0] != '' and not any(row[1:])
+
+
+# The sheets lay tables out like the droptables page: a location header row,
+# optional rotation header rows, two column item and rate rows, and a blank
+# row between locations. These mirror drops.parse_table_missions and
+# drops.parse_table_relics so both sources produce the same structures.
+
+def parse_rows_missions(rows):
+    result = []
+
+    location = None
+    location_data = []
+    rotation = None
+    rotation_data = []
+
+    for row in rows:
+        if is_blank_row(row):
+            if rotation_data:
+                location_data.append((rotation, rotation_data))
+            if location_data:
+                result.append((location, location_data))
+
+            location = None
+            location_data = []
+            rotation = None
+            rotation_data = []
+            continue
+
+        if is_header_row(row):
+            if location:
+                if rotation_data:
+                    location_data.append((rotation, rotation_data))
+                rotation = row[0]
+                rotation_data = []
+            else:
+                location = row[0]
+        else:
+            if len(row) < 2 or any(row[2:]):
+                raise ParseException('Unexpected data length')
+            rotation_data.append(row[:2])
+
+    if rotation_data:
+        location_data.append((rotation, rotation_data))
+    if location_data:
+        result.append((location, location_data))
+
+    return result
+
+
+def parse_rows_relics(rows):
+    result = []
+
+    location = None
+    current_data = []
+
+    for row in rows:
+        if is_blank_row(row):
+            if current_data:
+                result.append((location, current_data))
+
+            location = None
+            current_data = []
+            continue
+
+        if is_header_row(row):
+            if location is not None:
+                raise ParseException('Expected blank-row before header')
+            location = row[0]
+        else:
+            if len(row) < 2 or any(row[2:]):
+                raise ParseException('Unexpected data length')
+            current_data.append(row[:2])
+
+    if current_data:
+        result.append((location, current_data))
+
+    return result
+
+
+def get_sheet(name, url, parse_rows, nc=True, save=True):
+    path = 'drops2/{}.json'.format(name)
+    if nc and os.path.isfile(path):
+        return cache.load_json(path)
+
+    result = parse_rows(get_sheet_rows(url))
+
+    if save:
+        if not os.path.isdir('drops2'):
+            os.makedirs('drops2')
+
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    return result
+
+
+def get_missions(nc=True, save=True):
+    return get_sheet('missions', MISSIONS_URL, parse_rows_missions, nc, save)
+
+
+def get_relics(nc=True, save=True):
+    return get_sheet('relics', RELICS_URL, parse_rows_relics, nc, save)
+
+
+def get_keys(nc=True, save=True):
+    return get_sheet('keys', KEYS_URL, parse_rows_missions, nc, save)
+
+
+def get_dynamic_locations(nc=True, save=True):
+    return get_sheet('dynamic_locations', SHEET_URL_FORMAT.format(DYNAMIC_LOCATIONS_URL), parse_rows_missions, nc, save)
+
+
+SHEETS = [
+    ('missions', MISSIONS_URL, parse_rows_missions),
+    ('relics', RELICS_URL, parse_rows_relics)
+]
+
+
+def check_missions(missions):
+    for location, location_data in missions:
+        for rotation, rotation_data in location_data:
+            for item, rate in rotation_data:
+                if not RATE_PATTERN.match(rate):
+                    raise ParseException('Unexpected rate {} for {} in {}'.format(rate, item, location))
+
+
+def check_relics(relics):
+    for location, location_data in relics:
+        if not location.endswith(')') or ' Relic (' not in location:
+            raise ParseException('Unexpected relic location {}'.format(location))
+        for item, rate in location_data:
+            if not RATE_PATTERN.match(rate):
+                raise ParseException('Unexpected rate {} for {} in {}'.format(rate, item, location))
+
+
+CHECKS = {
+    'missions': check_missions,
+    'relics': check_relics
+}
+
+
+def record_samples(path=SAMPLES_PATH, num_lines=60):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    for name, url, parse_rows in SHEETS:
+        lines = []
+        for line in get_sheet_lines(url):
+            lines.append(line)
+            if len(lines) >= num_lines:
+                break
+
+        with open(os.path.join(path, name + '.csv'), 'w', newline='') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def check_samples(path=SAMPLES_PATH):
+    for name, url, parse_rows in SHEETS:
+        sample_path = os.path.join(path, name + '.csv')
+        if not os.path.isfile(sample_path):
+            raise RuntimeError('No sample {}, record one with --record-samples'.format(sample_path))
+
+        with open(sample_path, newline='') as f:
+            result = parse_rows(get_rows(f))
+        if not result:
+            raise ParseException('Nothing parsed from {}'.format(sample_path))
+        CHECKS[name](result)
+
+        print('{} {} locations'.format(name, len(result)))
+
+
+def get_mission_rates(missions):
+    rates = {}
+    for location, location_data in missions:
+        for rotation, rotation_data in location_data:
+            for item, rate in rotation_data:
+                rates[(location, rotation, item)] = rate
+    return rates
+
+
+def get_relic_rates(relics):
+    rates = {}
+    for location, location_data in relics:
+        for item, rate in location_data:
+            rates[(location, item)] = rate
+    return rates
+
+
+def diff_rates(expected, actual):
+    # Discrepancies between two sources as (key, expected rate, actual rate),
+    # with None for an entry missing from one side.
+    discrepancies = []
+    for key in sorted(set(expected) | set(actual), key=lambda key: tuple(str(part) for part in key)):
+        expected_rate = expected.get(key)
+        actual_rate = actual.get(key)
+        if expected_rate != actual_rate:
+            discrepancies.append((key, expected_rate, actual_rate))
+    return discrepancies
+
+
+def validate():
+    import drops
+
+    # Checked first so a layout or rate format change in the sheets fails
+    # here instead of showing up as every entry differing.
+    missions = get_missions()
+    relics = get_relics()
+    check_missions(missions)
+    check_relics(relics)
+
+    discrepancies = []
+    discrepancies += diff_rates(get_mission_rates(drops.get_missions()), get_mission_rates(missions))
+    discrepancies += diff_rates(get_relic_rates(drops.get_relics()), get_relic_rates(relics))
+
+    for key, expected_rate, actual_rate in discrepancies:
+        print('{} droptables={} sheets={}'.format(' / '.join(str(part) for part in key), expected_rate, actual_rate))
+    print('{} discrepancies'.format(len(discrepancies)))
+
+    return discrepancies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--validate', action='store_true')
+    parser.add_argument('--record-samples', action='store_true')
+    parser.add_argument('--check-samples', action='store_true')
+    args = parser.parse_args()
+
+    if args.validate:
+        validate()
+        return
+
+    if args.record_samples:
+        record_samples()
+        return
+
+    if args.check_samples:
+        check_samples()
+        return
+
+    get_missions(nc=False, save=True)
+    get_relics(nc=False, save=True)
+
+
+if __name__ == '__main__':
+    main()
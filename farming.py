@@ -0,0 +1,111 @@
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+import drops
+import market
+import relics
+
+
+class ParseException(Exception):
+    pass
+
+
+ROTATIONS = ['Rotation A', 'Rotation B', 'Rotation C']
+
+# A standard rotation cycle rewards A, A, B, C.
+CYCLE_WEIGHTS = np.array([2.0, 1.0, 1.0])
+
+
+def get_rotation_indices(rotation):
+    # Missions without rotations give the same reward table every time, so
+    # it fills all three rotation slots.
+    if rotation is None:
+        return range(len(ROTATIONS))
+    if rotation not in ROTATIONS:
+        raise ParseException('Unexpected rotation {}'.format(rotation))
+    return [ROTATIONS.index(rotation)]
+
+
+def get_mission_table(mission_drops, relic_names):
+    # Relic drop rates of every (node, rotation) as one matrix over the relic
+    # axis, so all nodes are valued with a single matrix product.
+    relic_index = {relic: i for i, relic in enumerate(relic_names)}
+
+    locations = [location for location, location_data in mission_drops]
+    rates = np.zeros((len(locations), len(ROTATIONS), len(relic_names)))
+
+    missing = set()
+
+    for i, (location, location_data) in enumerate(mission_drops):
+        for rotation, rotation_data in location_data:
+            for drop_item, rate_str in rotation_data:
+                if not drop_item.endswith(' Relic'):
+                    continue
+                j = relic_index.get(drop_item[:-len(' Relic')])
+                if j is None:
+                    missing.add(drop_item)
+                    continue
+                rate = float(relics.get_rate(rate_str))
+                for k in get_rotation_indices(rotation):
+                    rates[i, k, j] += rate
+
+    # A node dropping an unknown relic would be ranked too low, so the whole
+    # ranking is refused like an unresolved drop in the relic table.
+    if missing:
+        raise RuntimeError('Could not find relic {}'.format(', '.join(sorted(missing))))
+
+    return {
+        'locations': locations,
+        'rates': rates
+    }
+
+
+def get_mission_yields(mission_table, relic_evs):
+    rotation_yields = mission_table['rates'] @ relic_evs
+    cycle_yields = rotation_yields @ CYCLE_WEIGHTS
+    return rotation_yields, cycle_yields
+
+
+def get_ranked_missions(refinement='Intact', num_players=1, mission_drops=None, relic_drops=None, items=None):
+    if mission_drops is None:
+        mission_drops = drops.get_missions()
+    if relic_drops is None:
+        relic_drops = drops.get_relics()
+    if items is None:
+        items = market.get_items()
+
+    relic_table = relics.get_relic_table(relics.get_relic_data_by_location(relic_drops), items)
+    ev_by_relic = relics.get_relic_evs(relic_table, refinement, num_players)
+
+    relic_names = sorted(ev_by_relic)
+    relic_evs = np.array([ev_by_relic[relic] for relic in relic_names])
+
+    mission_table = get_mission_table(mission_drops, relic_names)
+    rotation_yields, cycle_yields = get_mission_yields(mission_table, relic_evs)
+
+    order = np.argsort(-cycle_yields, kind='stable')
+
+    return [
+        [mission_table['locations'][i]] + rotation_yields[i].tolist() + [float(cycle_yields[i])]
+        for i in order
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--refinement', choices=relics.REFINEMENTS, default='Intact')
+    parser.add_argument('--squad-size', type=int, default=1)
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    rows = get_ranked_missions(args.refinement, args.squad_size)
+    if args.limit is not None:
+        rows = rows[:args.limit]
+
+    print(tabulate(rows, headers=['Location', 'A', 'B', 'C', 'AABC'], floatfmt='.2f'))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,16 @@
 import argparse
+import fnmatch
+import json
 import re
+import socket
+import sys
 
-from tabulate import tabulate
 
-import market
-import drops
+# Unix socket of the fmarketd daemon, relative to the data directory like the
+# drops/ and market/ caches.
+SOCKET_PATH = 'fmarket.sock'
+
+REFINEMENTS = ['Intact', 'Exceptional', 'Flawless', 'Radiant']
 
 
 def parse_relic_args(relic_args):
@@ -29,6 +35,8 @@ def parse_relic_args(relic_args):
             else:
                 raise RuntimeError('Invalid relic type')
             relic_arg = relic_arg[1:]
+        elif relic_type is None:
+            raise RuntimeError('Missing relic type in {}'.format(relic_arg))
 
         relics.append('{} {}'.format(relic_type, relic_arg))
 
@@ -40,14 +48,12 @@ def parse_rate(rate_str):
     return float(rate.group(1)) if rate else None
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('relics', nargs='+')
-    parser.add_argument('--sort-name', action='store_true')
-    parser.add_argument('--sort-price', action='store_true')
-    args = parser.parse_args()
-
-    relics = parse_relic_args(args.relics)
+def load_state():
+    # drops and market pull in bs4 and requests, so they are only imported
+    # when the query is answered in this process.
+    import drops
+    import market
+    import search
 
     relic_drops = drops.get_relics()
     relic_data_by_location = {}
@@ -58,7 +64,87 @@ def main():
 
         relic_data_by_location[location] = location_data
 
-    items = market.get_items()
+    relic_names = sorted(set(location[:location.index(' Relic (')] for location in relic_data_by_location))
+
+    return {
+        'relic_data_by_location': relic_data_by_location,
+        'relic_names': relic_names,
+        'item_index': market.get_item_index(market.get_items()),
+        'drop_name_index': search.build_index(search.get_drop_names(relic_drops))
+    }
+
+
+def get_not_found_message(state, drop_item):
+    import search
+
+    return search.get_not_found_message(search.build_index(state['item_index']), drop_item)
+
+
+def resolve_item_query(state, text):
+    # Free-text item lookup: the closest drop name and every relic dropping it.
+    import search
+
+    matches = search.search(state['drop_name_index'], text, 1)
+    if not matches:
+        raise RuntimeError('No drop matches {}'.format(text))
+    drop_item = matches[0][0]
+
+    relic_data_by_location = state['relic_data_by_location']
+    relics = [
+        relic
+        for relic in state['relic_names']
+        if any(name == drop_item for name, rate_str in relic_data_by_location.get(relic + ' Relic (Intact)', []))
+    ]
+
+    return drop_item, relics
+
+
+def resolve_relic_query(state, query):
+    # A query is either a full relic name such as "Axi A5", relic codes as
+    # accepted by parse_relic_args, a wildcard pattern such as "Axi *" or
+    # "N1*", or "containing <drop>". Session lines starting with "item " are
+    # free-text item queries instead.
+    query = query.strip()
+
+    name = query.lower()
+    if name.endswith(' relic'):
+        name = name[:-len(' relic')]
+    for relic in state['relic_names']:
+        if relic.lower() == name:
+            return [relic]
+
+    containing = re.match(r'^(?:all relics )?containing (.+)$', query, re.IGNORECASE)
+    if containing:
+        text = containing.group(1).lower()
+        relic_data_by_location = state['relic_data_by_location']
+        return [
+            relic
+            for relic in state['relic_names']
+            if any(text in drop_item.lower() for drop_item, rate_str in relic_data_by_location.get(relic + ' Relic (Intact)', []))
+        ]
+
+    if '*' in query or '?' in query:
+        # Patterns with a space match the full name, otherwise just the code.
+        pattern = query.upper()
+        full_name = ' ' in pattern
+        return [
+            relic
+            for relic in state['relic_names']
+            if fnmatch.fnmatchcase((relic if full_name else relic.split(' ', 1)[1]).upper(), pattern)
+        ]
+
+    # Still a name, just not a known one, so it is not read as codes.
+    words = name.split()
+    if len(words) == 2 and words[0] in ('lith', 'meso', 'neo', 'axi', 'requiem'):
+        return ['{} {}'.format(words[0].capitalize(), words[1].upper())]
+
+    return parse_relic_args(query.split())
+
+
+def get_rows(state, relics):
+    import market
+
+    relic_data_by_location = state['relic_data_by_location']
 
     rows = []
 
@@ -67,28 +153,195 @@ def main():
 
         location_data = relic_data_by_location[location]
 
+        drop_items = [drop_item for drop_item, rate_str in location_data if drop_item != 'Forma Blueprint']
+        item_by_drop_item = market.find_drop_items(state['item_index'], drop_items)
+
         for drop_item, rate_str in location_data:
             if drop_item == 'Forma Blueprint':
                 rows.append([location, drop_item, rate_str, -1])
                 continue
 
-            item = market.find_drop_item(items, drop_item)
+            item = item_by_drop_item[drop_item]
             if item is None:
-                raise RuntimeError('Could not find drop_item {}'.format(drop_item))
+                raise RuntimeError(get_not_found_message(state, drop_item))
 
             price = market.get_item_price(item)
 
             rows.append([location, drop_item, rate_str, price])
 
-    if args.sort_name:
+    return rows
+
+
+def format_rows(rows, sort_name=False, sort_price=False):
+    from tabulate import tabulate
+
+    if sort_name:
         rows.sort(key=lambda row: row[1])
-    elif args.sort_price:
+    elif sort_price:
         rows.sort(key=lambda row: row[3], reverse=True)
     else:
         rows.sort(key=lambda row: (parse_rate(row[2]), row[2], -row[3]))
-    print(tabulate(rows, headers=['Location', 'Drop', 'Rate', 'Price']))
+    return tabulate(rows, headers=['Location', 'Drop', 'Rate', 'Price'])
+
+
+def get_refinement_rows(state, relics):
+    import market
+
+    relic_data_by_location = state['relic_data_by_location']
+
+    rows = []
+
+    for relic in relics:
+        rate_strs = [dict(relic_data_by_location[relic + ' Relic ({})'.format(refinement)]) for refinement in REFINEMENTS]
+
+        drop_items = list(rate_strs[0])
+        item_by_drop_item = market.find_drop_items(state['item_index'], [drop_item for drop_item in drop_items if drop_item != 'Forma Blueprint'])
+
+        for drop_item in drop_items:
+            if drop_item == 'Forma Blueprint':
+                price = -1
+            else:
+                item = item_by_drop_item[drop_item]
+                if item is None:
+                    raise RuntimeError(get_not_found_message(state, drop_item))
+
+                price = market.get_item_price(item)
+
+            rows.append([relic, drop_item] + [parse_rate(rate_str.get(drop_item, '')) for rate_str in rate_strs] + [price])
+
+    return rows
+
+
+def format_refinement_rows(rows, sort_name=False, sort_price=False):
+    from tabulate import tabulate
+
+    if sort_name:
+        rows.sort(key=lambda row: (row[0], row[1]))
+    elif sort_price:
+        rows.sort(key=lambda row: (row[0], -row[6]))
+    else:
+        rows.sort(key=lambda row: (row[0], row[2], -row[6]))
+    return tabulate(rows, headers=['Relic', 'Drop'] + REFINEMENTS + ['Price'], floatfmt='.2f')
+
+
+def check_relics(state, relics):
+    unknown = sorted(set(relics) - set(state['relic_names']))
+    if unknown:
+        raise RuntimeError('Unknown relic {}'.format(', '.join(unknown)))
+
+
+def query(state, request):
+    if request.get('item'):
+        drop_item, relics = resolve_item_query(state, request['item'])
+        rows = [row for row in get_refinement_rows(state, relics) if row[1] == drop_item]
+        return format_refinement_rows(rows, request.get('sort_name', False), request.get('sort_price', False))
+
+    check_relics(state, request['relics'])
+
+    if request.get('refinements', False):
+        rows = get_refinement_rows(state, request['relics'])
+        return format_refinement_rows(rows, request.get('sort_name', False), request.get('sort_price', False))
+
+    rows = get_rows(state, request['relics'])
+    return format_rows(rows, request.get('sort_name', False), request.get('sort_price', False))
+
+
+def run_session(state, f, sort_name=False, sort_price=False, interactive=False):
+    # One query per line, each answered as soon as it is read. Bad queries
+    # are reported and skipped instead of ending the session.
+    while True:
+        if interactive:
+            print('> ', end='', flush=True)
+
+        line = f.readline()
+        if not line:
+            break
+
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            if line.lower().startswith('item '):
+                request = {'item': line[len('item '):]}
+            else:
+                relics = resolve_relic_query(state, line)
+                if not relics:
+                    raise RuntimeError('No relics match')
+                request = {'relics': relics, 'refinements': True}
+            request['sort_name'] = sort_name
+            request['sort_price'] = sort_price
+            result = query(state, request)
+        except (RuntimeError, KeyError) as e:
+            print('{}: {}'.format(line, e), file=sys.stderr, flush=True)
+            continue
+
+        print('# {}'.format(line))
+        print(result, end='\n\n', flush=True)
+
+
+def query_daemon(request, path=SOCKET_PATH):
+    # Returns None when no daemon is listening, or it goes away or answers
+    # garbage mid-request, so the caller can fall back to answering in process.
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except AttributeError:
+        return None
+
+    with client:
+        try:
+            client.connect(path)
+            client.sendall(json.dumps(request).encode() + b'\n')
+            with client.makefile('rb') as f:
+                response = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    if not isinstance(response, dict) or ('error' not in response and 'result' not in response):
+        return None
+
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+
+    return response['result']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('relics', nargs='*')
+    parser.add_argument('--sort-name', action='store_true')
+    parser.add_argument('--sort-price', action='store_true')
+    parser.add_argument('--refinements', action='store_true')
+    parser.add_argument('--item', metavar='TEXT', help='show the relics dropping the item closest to TEXT')
+    parser.add_argument('--session', metavar='FILE', help='read one query per line from FILE, - for stdin')
+    parser.add_argument('--no-daemon', action='store_true')
+    args = parser.parse_args()
+
+    if args.session is not None:
+        state = load_state()
+        if args.session == '-':
+            run_session(state, sys.stdin, args.sort_name, args.sort_price, sys.stdin.isatty())
+        else:
+            with open(args.session) as f:
+                run_session(state, f, args.sort_name, args.sort_price)
+        return
+
+    if args.item is not None:
+        request = {'item': args.item}
+    elif args.relics:
+        request = {'relics': parse_relic_args(args.relics), 'refinements': args.refinements}
+    else:
+        parser.error('relics, --item or --session is required')
+
+    request['sort_name'] = args.sort_name
+    request['sort_price'] = args.sort_price
+
+    result = None if args.no_daemon else query_daemon(request)
+    if result is None:
+        result = query(load_state(), request)
+
+    print(result)
 
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+
+import fmarket
+import market
+
+
+# Same freshness as the market/items/*/statistics cache in market.get_stats.
+PRICE_TTL = timedelta(days=1)
+
+# The state is rebuilt when any of these change, so refreshing the drop or
+# item tables does not need a restart.
+STATE_PATHS = ['drops/relics.json', 'market/items.json', market.ALIASES_PATH]
+
+
+def get_state_mtimes():
+    mtimes = []
+    for path in STATE_PATHS:
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            mtimes.append(None)
+    return mtimes
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+
+        if datetime.utcnow() - server.prices_time > PRICE_TTL:
+            market.price_by_url_name.clear()
+            server.prices_time = datetime.utcnow()
+
+        try:
+            # A failed reload keeps the old state and is retried on the next
+            # request.
+            state_mtimes = get_state_mtimes()
+            if state_mtimes != server.state_mtimes:
+                market.aliases = None
+                server.state = fmarket.load_state()
+                server.state_mtimes = state_mtimes
+
+            request = json.loads(self.rfile.readline())
+            response = {'result': fmarket.query(server.state, request)}
+        except Exception as e:
+            response = {'error': '{}: {}'.format(type(e).__name__, e)}
+
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+def serve(path=fmarket.SOCKET_PATH):
+    if os.path.exists(path):
+        # A stale socket from a previous daemon refuses connections; a live
+        # one means another daemon already serves this directory.
+        if fmarket.query_daemon({'relics': []}, path) is not None:
+            raise RuntimeError('Daemon already running on {}'.format(path))
+        os.remove(path)
+
+    state_mtimes = get_state_mtimes()
+    state = fmarket.load_state()
+
+    # Exit through the finally below on kill so the socket is removed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        server.state = state
+        server.state_mtimes = state_mtimes
+        server.prices_time = datetime.utcnow()
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', default=fmarket.SOCKET_PATH)
+    args = parser.parse_args()
+
+    serve(args.socket)
+
+
+if __name__ == '__main__':
+    main()
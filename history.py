@@ -0,0 +1,222 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import argparse
+import csv
+import heapq
+import json
+import os
+
+from tabulate import tabulate
+
+
+HISTORY_PATH = 'out/ev_history'
+
+COLUMNS = ['relic', 'refinement', 'squad_size', 'model', 'timestamp', 'value']
+
+COLUMN_TYPES = {
+    'relic': str,
+    'refinement': str,
+    'squad_size': int,
+    'model': str,
+    'timestamp': str,
+    'value': float
+}
+
+# Timestamps are UTC so that appends stay in time order across clock
+# changes such as a DST fall-back.
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def format_timestamp(timestamp):
+    return timestamp.strftime(TIMESTAMP_FORMAT)
+
+
+# Rows count only once their column offsets are in the committed file, which
+# is replaced last. Anything past those offsets is a torn append and gets
+# truncated by the next one.
+COMMITTED_FILENAME = 'committed.json'
+
+
+def get_column_path(path, column):
+    return os.path.join(path, column + '.txt')
+
+
+def read_committed(path):
+    committed_path = os.path.join(path, COMMITTED_FILENAME)
+    if os.path.isfile(committed_path):
+        with open(committed_path) as f:
+            return json.load(f)
+
+    return {
+        'rows': 0,
+        'offsets': {column: 0 for column in COLUMNS},
+        'last_timestamp': None
+    }
+
+
+def write_committed(path, committed):
+    committed_path = os.path.join(path, COMMITTED_FILENAME)
+    with open(committed_path + '.tmp', 'w') as f:
+        json.dump(committed, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(committed_path + '.tmp', committed_path)
+
+
+def append_history(rows, path=HISTORY_PATH):
+    # Each column lives in its own file and rows are only ever appended, so a
+    # run costs one buffered write per column no matter how large the store is.
+    if not rows:
+        return
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    rows = [
+        dict(row, timestamp=format_timestamp(row['timestamp'])) if isinstance(row['timestamp'], datetime) else row
+        for row in rows
+    ]
+
+    # Queries bisect the on-disk order, so rows must arrive in time order.
+    rows = sorted(rows, key=lambda row: row['timestamp'])
+    committed = read_committed(path)
+    if committed['last_timestamp'] is not None and rows[0]['timestamp'] < committed['last_timestamp']:
+        raise RuntimeError('Timestamp {} is older than the history'.format(rows[0]['timestamp']))
+
+    offsets = {}
+    for column in COLUMNS:
+        lines = []
+        for row in rows:
+            value = str(row[column])
+            if '\n' in value:
+                raise RuntimeError('Invalid {} {}'.format(column, value))
+            lines.append(value + '\n')
+
+        column_path = get_column_path(path, column)
+        with open(column_path, 'ab') as f:
+            f.truncate(committed['offsets'][column])
+            f.write(''.join(lines).encode())
+            f.flush()
+            os.fsync(f.fileno())
+            offsets[column] = f.tell()
+
+    write_committed(path, {
+        'rows': committed['rows'] + len(rows),
+        'offsets': offsets,
+        'last_timestamp': rows[-1]['timestamp']
+    })
+
+
+def load_history(path=HISTORY_PATH):
+    # Columns are parsed on first use, so a query only reads what it touches.
+    committed = read_committed(path)
+    return {
+        'path': path,
+        'rows': committed['rows'],
+        'offsets': committed['offsets'],
+        'columns': {}
+    }
+
+
+def get_column(history, column):
+    values = history['columns'].get(column)
+    if values is None:
+        values = []
+        column_path = get_column_path(history['path'], column)
+        if history['rows']:
+            with open(column_path, 'rb') as f:
+                data = f.read(history['offsets'][column])
+            column_type = COLUMN_TYPES[column]
+            values = [column_type(line) for line in data.decode().split('\n')[:-1]]
+        history['columns'][column] = values
+
+    return values
+
+
+def get_range_indices(history, start=None, end=None):
+    timestamps = get_column(history, 'timestamp')
+
+    lo = 0 if start is None else bisect_left(timestamps, format_timestamp(start))
+    hi = len(timestamps) if end is None else bisect_right(timestamps, format_timestamp(end))
+
+    return range(lo, hi)
+
+
+def filter_indices(history, indices, relic=None, refinement=None, squad_size=None, model=None):
+    for column, wanted in (('relic', relic), ('refinement', refinement), ('squad_size', squad_size), ('model', model)):
+        if wanted is None:
+            continue
+        values = get_column(history, column)
+        indices = [i for i in indices if values[i] == wanted]
+
+    return indices
+
+
+def get_rows(history, indices):
+    columns = {column: get_column(history, column) for column in COLUMNS}
+    return [{column: columns[column][i] for column in COLUMNS} for i in indices]
+
+
+def query_range(history, start=None, end=None, **filters):
+    indices = get_range_indices(history, start, end)
+    indices = filter_indices(history, indices, **filters)
+    return get_rows(history, indices)
+
+
+def query_top(history, k, start=None, end=None, **filters):
+    indices = get_range_indices(history, start, end)
+    indices = filter_indices(history, indices, **filters)
+    values = get_column(history, 'value')
+    return get_rows(history, heapq.nlargest(k, indices, key=values.__getitem__))
+
+
+def export_csv(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def export_json(rows, path):
+    with open(path, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('query', choices=['range', 'top'])
+    parser.add_argument('relic', nargs='?')
+    parser.add_argument('--refinement')
+    parser.add_argument('--squad-size', type=int)
+    parser.add_argument('--model')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='UTC')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='UTC')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--csv')
+    parser.add_argument('--json')
+    args = parser.parse_args()
+
+    history = load_history()
+
+    filters = {
+        'relic': args.relic,
+        'refinement': args.refinement,
+        'squad_size': args.squad_size,
+        'model': args.model
+    }
+
+    if args.query == 'range':
+        rows = query_range(history, args.since, args.until, **filters)
+    else:
+        rows = query_top(history, args.k, args.since, args.until, **filters)
+
+    if args.csv:
+        export_csv(rows, args.csv)
+    if args.json:
+        export_json(rows, args.json)
+
+    print(tabulate([[row[column] for column in COLUMNS] for row in rows], headers=COLUMNS))
+
+
+if __name__ == '__main__':
+    main()
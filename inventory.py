@@ -0,0 +1,104 @@
+import argparse
+import csv
+
+import numpy as np
+from tabulate import tabulate
+
+import drops
+import market
+import relics
+import search
+
+
+def parse_refinement(text):
+    # Case-insensitive, and any unambiguous prefix such as "rad" will do.
+    matches = [refinement for refinement in relics.REFINEMENTS if refinement.lower().startswith(text.lower())]
+    if len(matches) != 1:
+        raise RuntimeError('Invalid refinement {}'.format(text))
+    return matches[0]
+
+
+def read_inventory(path):
+    # CSV with a Name, Refinement and Quantity column. Refinement only
+    # applies to relics and defaults to Intact.
+    lines = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            name = row['Name'].strip()
+            if name.endswith(' Relic'):
+                name = name[:-len(' Relic')]
+            refinement = (row.get('Refinement') or '').strip() or None
+            if refinement is not None:
+                refinement = parse_refinement(refinement)
+            lines.append((name, refinement, int(row['Quantity'])))
+    return lines
+
+
+def value_inventory(lines, items=None, relic_drops=None):
+    if items is None:
+        items = market.get_items()
+    if relic_drops is None:
+        relic_drops = drops.get_relics()
+
+    relic_data_by_location = relics.get_relic_data_by_location(relic_drops)
+
+    locations = set()
+    drop_items = set()
+    for name, refinement, quantity in lines:
+        location = relics.get_location(name, refinement or 'Intact')
+        if location in relic_data_by_location:
+            locations.add(location)
+        elif refinement is not None:
+            raise RuntimeError('Unknown relic {}'.format(location))
+        else:
+            drop_items.add(name)
+
+    # All names resolve through one index and only the relics that appear in
+    # the inventory get priced, so a cold cache fetches just what is needed.
+    item_index = market.get_item_index(items)
+    item_by_drop_item = search.check_missing(item_index, market.find_drop_items(item_index, sorted(drop_items)))
+
+    unit_value_by_name = {
+        drop_item: market.get_item_price(item) or 0.0
+        for drop_item, item in item_by_drop_item.items()
+    }
+
+    if locations:
+        table = relics.get_relic_table({location: relic_data_by_location[location] for location in locations}, items)
+        for location, ev in zip(table['locations'], relics.get_squad_evs(table)):
+            unit_value_by_name[location] = float(ev)
+
+    keys = []
+    for name, refinement, quantity in lines:
+        location = relics.get_location(name, refinement or 'Intact')
+        keys.append(location if location in locations else name)
+
+    quantities = np.array([quantity for name, refinement, quantity in lines], dtype=float)
+    unit_values = np.array([unit_value_by_name[key] for key in keys])
+    values = quantities * unit_values
+
+    rows = [
+        [key, int(quantity), unit_value, value]
+        for key, quantity, unit_value, value in zip(keys, quantities, unit_values.tolist(), values.tolist())
+    ]
+
+    return rows, float(values.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inventory')
+    parser.add_argument('--sort-value', action='store_true')
+    args = parser.parse_args()
+
+    rows, total = value_inventory(read_inventory(args.inventory))
+
+    if args.sort_value:
+        rows.sort(key=lambda row: row[3], reverse=True)
+
+    print(tabulate(rows, headers=['Item', 'Quantity', 'Unit Value', 'Value'], floatfmt='.2f'))
+    print('Total {:.2f}'.format(total))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,10 @@ import csv
 import json
 import os
 import re
-import time
 
-import requests
+import cache
+import metrics
+import transport
 
 
 class ParseException(Exception):
@@ -21,10 +22,12 @@ FILENAME_TIME_FORMAT = '%Y-%m-%dT%H.%M.%S.json'
 
 def get_items(nc=True, save=True):
     if nc and os.path.isfile('market/items.json'):
-        with open('market/items.json') as f:
-            return json.load(f)
+        metrics.cache_hit('items')
+        return cache.load_json('market/items.json')
+    metrics.cache_miss('items')
 
-    payload = requests.get(ITEMS_URL).json()
+    with metrics.span('http.items'):
+        payload = transport.get(ITEMS_URL).json()
     items = payload['data']
 
     if save:
@@ -48,30 +51,34 @@ def get_stats(item, nc_delta=timedelta(days=1), save=True):
 
     latest_time = None
     latest_path = None
-    for filename in os.listdir(stats_path):
-        path = os.path.join(stats_path, filename)
-        if not os.path.isfile(path):
-            continue
-        try:
-            file_time = datetime.strptime(filename, FILENAME_TIME_FORMAT)
-        except ValueError:
-            raise
-        if latest_time is None or file_time > latest_time:
-            latest_time = file_time
-            latest_path = path
+    with metrics.span('market.stats_scan'):
+        for filename in os.listdir(stats_path):
+            path = os.path.join(stats_path, filename)
+            if not os.path.isfile(path):
+                continue
+            try:
+                file_time = datetime.strptime(filename, FILENAME_TIME_FORMAT)
+            except ValueError:
+                raise
+            if latest_time is None or file_time > latest_time:
+                latest_time = file_time
+                latest_path = path
 
     if latest_path is None or nc_delta is None or datetime.utcnow() - nc_delta > latest_time:
+        metrics.cache_miss('stats')
         save_time = datetime.utcnow()
-        response = requests.get(STATISTICS_URL_FORMAT.format(url_name))
-        stats = response.json()
+        with metrics.span('http.statistics'):
+            response = transport.get(STATISTICS_URL_FORMAT.format(url_name))
+            stats = response.json()
 
-        time.sleep(0.5)
+        metrics.sleep(0.5)
 
         if save:
             path = os.path.join(stats_path, save_time.strftime(FILENAME_TIME_FORMAT))
             with open(path, 'w') as f:
                 json.dump(stats, f, indent=2)
     else:
+        metrics.cache_hit('stats')
         with open(latest_path) as f:
             stats = json.load(f)
 
@@ -84,6 +91,32 @@ DROP_ITEM_NAME_MAP = {
     'Kavasa Prime Band': 'Kavasa Prime Collar Band'
 }
 
+# Aliases saved with search.py, checked before DROP_ITEM_NAME_MAP.
+ALIASES_PATH = 'market/aliases.json'
+
+aliases = None
+
+def get_aliases():
+    global aliases
+    if aliases is None:
+        aliases = {}
+        if os.path.isfile(ALIASES_PATH):
+            with open(ALIASES_PATH) as f:
+                aliases = json.load(f)
+
+    return aliases
+
+
+def save_alias(drop_item, item_name):
+    get_aliases()[drop_item] = item_name
+
+    if not os.path.isdir('market'):
+        os.makedirs('market')
+
+    with open(ALIASES_PATH, 'w') as f:
+        json.dump(aliases, f, indent=2, sort_keys=True)
+
+
 def find_drop_item(items, drop_item):
     # items = items['payload']['items']['en']
 
@@ -91,7 +124,9 @@ def find_drop_item(items, drop_item):
         if item['i18n']['en']['name'] == drop_item:
             return item
 
-    if drop_item in DROP_ITEM_NAME_MAP:
+    if drop_item in get_aliases():
+        drop_item = aliases[drop_item]
+    elif drop_item in DROP_ITEM_NAME_MAP:
         drop_item = DROP_ITEM_NAME_MAP[drop_item]
     elif drop_item.endswith(' Blueprint'):
         drop_item = drop_item[:-len(' Blueprint')]
@@ -99,10 +134,31 @@ def find_drop_item(items, drop_item):
         return
 
     for item in items:
-        if item['item_name'] == drop_item:
+        if item['i18n']['en']['name'] == drop_item:
             return item
 
 
+def get_item_index(items):
+    return {item['i18n']['en']['name']: item for item in items}
+
+
+def find_drop_items(item_index, drop_items):
+    # Bulk find_drop_item against a prebuilt get_item_index. Names that
+    # cannot be resolved map to None.
+    result = {}
+    for drop_item in drop_items:
+        item = item_index.get(drop_item)
+        if item is None:
+            if drop_item in get_aliases():
+                item = item_index.get(aliases[drop_item])
+            elif drop_item in DROP_ITEM_NAME_MAP:
+                item = item_index.get(DROP_ITEM_NAME_MAP[drop_item])
+            elif drop_item.endswith(' Blueprint'):
+                item = item_index.get(drop_item[:-len(' Blueprint')])
+        result[drop_item] = item
+    return result
+
+
 def get_stats_price(stats):
     daily_entries = stats['payload']['statistics_closed']['90days']
 
@@ -126,6 +182,12 @@ def get_stats_price(stats):
     return last_entry['median']
 
 
+def get_stats_daily_prices(stats):
+    # Every daily median of the 90 day closed statistics, oldest first.
+    daily_entries = stats['payload']['statistics_closed']['90days']
+    return [entry['median'] for entry in sorted(daily_entries, key=lambda entry: entry['datetime'])]
+
+
 price_by_url_name = {}
 
 def get_item_price(item, memoize=True):
@@ -134,7 +196,9 @@ def get_item_price(item, memoize=True):
         url_name = item['urlName']
         price = price_by_url_name.get(url_name)
         if price is not None:
+            metrics.cache_hit('prices')
             return price
+        metrics.cache_miss('prices')
 
     stats = get_stats(item)
     price = get_stats_price(stats)
@@ -0,0 +1,163 @@
+from contextlib import contextmanager
+from datetime import datetime
+import atexit
+import json
+import os
+import sys
+import time
+
+
+# Set to an output directory (or 1 for out/metrics) to instrument any run.
+METRICS_ENV = 'WARFRAME_SS_METRICS'
+
+DEFAULT_PATH = 'out/metrics'
+
+
+enabled = False
+output_path = None
+
+# name -> [count, total seconds, max seconds]
+span_stats = {}
+
+# cache -> [hits, misses]
+cache_stats = {}
+
+sleep_seconds = 0.0
+
+
+def enable(path=DEFAULT_PATH):
+    global enabled, output_path
+    if enabled:
+        return
+
+    enabled = True
+    output_path = path
+    atexit.register(export)
+
+
+def record(name, seconds):
+    stats = span_stats.get(name)
+    if stats is None:
+        span_stats[name] = [1, seconds, seconds]
+    else:
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+
+@contextmanager
+def span(name):
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def cache_hit(cache):
+    if enabled:
+        cache_stats.setdefault(cache, [0, 0])[0] += 1
+
+
+def cache_miss(cache):
+    if enabled:
+        cache_stats.setdefault(cache, [0, 0])[1] += 1
+
+
+def sleep(seconds):
+    global sleep_seconds
+    time.sleep(seconds)
+    if enabled:
+        sleep_seconds += seconds
+
+
+def get_report():
+    http_count = sum(stats[0] for name, stats in span_stats.items() if name.startswith('http.'))
+    http_seconds = sum(stats[1] for name, stats in span_stats.items() if name.startswith('http.'))
+
+    return {
+        'spans': {
+            name: {'count': count, 'total_seconds': total, 'max_seconds': maximum}
+            for name, (count, total, maximum) in sorted(span_stats.items())
+        },
+        'http': {'count': http_count, 'total_seconds': http_seconds},
+        'caches': {
+            cache: {'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses)}
+            for cache, (hits, misses) in sorted(cache_stats.items())
+        },
+        'sleep_seconds': sleep_seconds
+    }
+
+
+def format_prometheus(report):
+    lines = []
+
+    lines.append('# TYPE warframe_ss_span_seconds_total counter')
+    for name, stats in report['spans'].items():
+        lines.append('warframe_ss_span_seconds_total{{span="{}"}} {}'.format(name, stats['total_seconds']))
+    lines.append('# TYPE warframe_ss_span_count counter')
+    for name, stats in report['spans'].items():
+        lines.append('warframe_ss_span_count{{span="{}"}} {}'.format(name, stats['count']))
+    lines.append('# TYPE warframe_ss_span_seconds_max gauge')
+    for name, stats in report['spans'].items():
+        lines.append('warframe_ss_span_seconds_max{{span="{}"}} {}'.format(name, stats['max_seconds']))
+
+    lines.append('# TYPE warframe_ss_cache_hits_total counter')
+    for cache, stats in report['caches'].items():
+        lines.append('warframe_ss_cache_hits_total{{cache="{}"}} {}'.format(cache, stats['hits']))
+    lines.append('# TYPE warframe_ss_cache_misses_total counter')
+    for cache, stats in report['caches'].items():
+        lines.append('warframe_ss_cache_misses_total{{cache="{}"}} {}'.format(cache, stats['misses']))
+
+    lines.append('# TYPE warframe_ss_sleep_seconds_total counter')
+    lines.append('warframe_ss_sleep_seconds_total {}'.format(report['sleep_seconds']))
+
+    return '\n'.join(lines) + '\n'
+
+
+def export(path=None):
+    path = path or output_path or DEFAULT_PATH
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    report = get_report()
+    name = datetime.now().strftime('%Y-%m-%dT%H.%M.%S')
+
+    with open(os.path.join(path, name + '.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    with open(os.path.join(path, name + '.prom'), 'w') as f:
+        f.write(format_prometheus(report))
+
+
+if __name__ != '__main__' and os.environ.get(METRICS_ENV):
+    enable(DEFAULT_PATH if os.environ[METRICS_ENV] == '1' else os.environ[METRICS_ENV])
+
+
+def main():
+    # python metrics.py [--path DIR] <module> [args...] runs that module's
+    # main with metrics enabled.
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('module')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # The instrumented modules import "metrics", not this __main__ copy.
+    import metrics
+    metrics.enable(args.path)
+
+    sys.argv = [args.module + '.py'] + args.args
+    runpy.run_module(args.module, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,30 +4,27 @@ import random
 import re
 import os
 
+import numpy as np
+
 import drops
+import history
 import market
+import metrics
+import search
 
 
 class ParseException(Exception):
     pass
 
 
-def main():
-    items = market.get_items()
-
-    current_relics = []
+REFINEMENTS = ['Intact', 'Exceptional', 'Flawless', 'Radiant']
 
-    mission_drops = drops.get_missions()
 
-    for location, location_data in mission_drops:
-        for rotation, rotation_data in location_data:
-            for drop_item, rate in rotation_data:
-                if drop_item.endswith(' Relic'):
-                    current_relics.append(drop_item[:-len(' Relic')])
+def get_location(relic, refinement):
+    return '{} Relic ({})'.format(relic, refinement)
 
-    current_relics = sorted(set(current_relics))
 
-    relic_drops = drops.get_relics()
+def get_relic_data_by_location(relic_drops):
     relic_data_by_location = {}
 
     for location, location_data in relic_drops:
@@ -36,129 +33,354 @@ def main():
 
         relic_data_by_location[location] = location_data
 
-    price_by_drop_item = {}
-    def get_drop_item_price(drop_item):
-        price = price_by_drop_item.get(drop_item)
-        if price is not None:
-            return price
-
-        item = market.find_drop_item(items, drop_item)
-        if item is None:
-            raise RuntimeError('Could not find drop_item {}'.format(drop_item))
-
-        price = market.get_item_price(item)
-        return price
-
-    rate_by_rate_str = {}
-    def get_rate(rate_str):
-        rate = rate_by_rate_str.get(rate_str)
-        if rate is not None:
-            return rate
-        
-        rate_match = re.search(r'\(([0-9]*.[0-9]*)%\)', rate_str)
-        if rate_match:
-            rate = rate_match.group(1)
-            rate = Decimal(rate) / Decimal(100)
-        else:
-            raise ParseException('Could not parse rate')
-        
-        rate_by_rate_str[rate_str] = rate
+    return relic_data_by_location
+
+
+rate_by_rate_str = {}
+
+def get_rate(rate_str):
+    rate = rate_by_rate_str.get(rate_str)
+    if rate is not None:
         return rate
 
+    rate_match = re.search(r'\(([0-9]*.[0-9]*)%\)', rate_str)
+    if rate_match:
+        rate = rate_match.group(1)
+        rate = Decimal(rate) / Decimal(100)
+    else:
+        raise ParseException('Could not parse rate')
 
-    if not os.path.isdir('out/ev_relics'):
-        os.makedirs('out/ev_relics')
+    rate_by_rate_str[rate_str] = rate
+    return rate
 
-    with open('out/ev_relics/{}.txt'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
-        for relic in current_relics:
-            def get_expected_value(location, debug=False):
-                location_data = relic_data_by_location[location]
 
-                expected_value = 0.0
-                total_rate = Decimal()
+def get_drop_item_price(items, drop_item):
+    item = market.find_drop_item(items, drop_item)
+    if item is None:
+        raise RuntimeError(search.get_not_found_message(search.build_index(market.get_item_index(items)), drop_item))
 
-                for drop_item, rate_str in location_data:
-                    if drop_item == 'Forma Blueprint':
-                        continue
+    return market.get_item_price(item)
 
-                    rate = get_rate(rate_str)
-                    price = get_drop_item_price(drop_item)
 
-                    total_rate += rate
-                    expected_value += price * float(rate)
+def get_expected_value(relic_data_by_location, items, location, debug=False):
+    location_data = relic_data_by_location[location]
 
-                    if debug:
-                        print(location, drop_item, rate, price)
+    expected_value = 0.0
+    total_rate = Decimal()
 
-                if total_rate <= 0.5:
-                    raise RuntimeError('Bad total_rate')
+    for drop_item, rate_str in location_data:
+        if drop_item == 'Forma Blueprint':
+            continue
 
-                return expected_value
+        rate = get_rate(rate_str)
+        price = get_drop_item_price(items, drop_item)
 
-            intact_location = relic + ' Relic (Intact)'
-            exceptional_location = relic + ' Relic (Exceptional)'
-            flawless_location = relic + ' Relic (Flawless)'
-            radiant_location = relic + ' Relic (Radiant)'
+        total_rate += rate
+        expected_value += price * float(rate)
 
-            intact_ev = get_expected_value(intact_location)
-            exceptional_ev = get_expected_value(exceptional_location)
-            flawless_ev = get_expected_value(flawless_location)
-            radiant_ev = get_expected_value(radiant_location)
+        if debug:
+            print(location, drop_item, rate, price)
 
-            print('{} {:.2f} {:.2f} {:.2f} {:.2f}'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
-            f.write('{} {:.2f} {:.2f} {:.2f} {:.2f}\n'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
+    if total_rate <= 0.5:
+        raise RuntimeError('Bad total_rate')
 
-    if not os.path.isdir('out/ev_mp4_relics'):
-        os.makedirs('out/ev_mp4_relics')
+    return expected_value
 
-    with open('out/ev_mp4_relics/{}.txt'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
-        for relic in current_relics:
-            def get_multiplayer_ev(location, num_players=4, trials=4096, debug=False):
-                location_data = relic_data_by_location[location]
 
-                total_value = Decimal()
+def get_multiplayer_ev(relic_data_by_location, items, location, num_players=4, trials=4096, debug=False):
+    location_data = relic_data_by_location[location]
+
+    total_value = Decimal()
+
+    actual_trials = 0
+
+    for _ in range(trials):
+        best_price = None
+
+        for _ in range(num_players):
+            roll = random.random()
+            cumulative_rate = Decimal()
+
+            for drop_item, rate_str in location_data:
+                if drop_item == 'Forma Blueprint':
+                    continue
+
+                rate = get_rate(rate_str)
+
+                cumulative_rate += rate
+
+                if cumulative_rate > roll:
+                    price = get_drop_item_price(items, drop_item)
+                    if best_price is None or price > best_price:
+                        best_price = price
+
+            if best_price is not None:
+                actual_trials += 1
+                total_value += Decimal(str(best_price))
+
+    return float(total_value) / actual_trials
+
+
+def get_relic_table(relic_data_by_location, items):
+    # Rates of every location as one (location x drop item) matrix with the
+    # drop items ordered by ascending price, so EVs of the whole catalogue are
+    # computed as array operations instead of per-location loops.
+    locations = sorted(relic_data_by_location)
+    drop_items = sorted(set(
+        drop_item
+        for location_data in relic_data_by_location.values()
+        for drop_item, rate_str in location_data
+        if drop_item != 'Forma Blueprint'
+    ))
+
+    item_index = market.get_item_index(items)
+    item_by_drop_item = search.check_missing(item_index, market.find_drop_items(item_index, drop_items))
+
+    prices = np.array([market.get_item_price(item_by_drop_item[drop_item]) or 0.0 for drop_item in drop_items])
+    price_order = np.argsort(prices, kind='stable')
+    drop_items = [drop_items[i] for i in price_order]
+    prices = prices[price_order]
+    drop_item_index = {drop_item: i for i, drop_item in enumerate(drop_items)}
+
+    rates = np.zeros((len(locations), len(drop_items)))
+    for i, location in enumerate(locations):
+        total_rate = Decimal()
+        for drop_item, rate_str in relic_data_by_location[location]:
+            if drop_item == 'Forma Blueprint':
+                continue
+            rate = get_rate(rate_str)
+            total_rate += rate
+            rates[i, drop_item_index[drop_item]] += float(rate)
+
+        if total_rate <= 0.5:
+            raise RuntimeError('Bad total_rate')
+
+    return {
+        'locations': locations,
+        'location_index': {location: i for i, location in enumerate(locations)},
+        'drop_items': drop_items,
+        'items': [item_by_drop_item[drop_item] for drop_item in drop_items],
+        'prices': prices,
+        'rates': rates
+    }
 
-                actual_trials = 0
 
-                for _ in range(trials):
-                    best_price = None
+def get_table_cdfs(table, rows=None):
+    # Probability that a single reward is worth at most each price. Forma and
+    # any rounding slack count as a worthless reward below every price.
+    rates = table['rates'] if rows is None else table['rates'][rows]
+    base = np.clip(1.0 - rates.sum(axis=-1, keepdims=True), 0.0, 1.0)
+    return base + np.cumsum(rates, axis=-1), base
 
-                    for _ in range(num_players):
-                        roll = random.random()
-                        cumulative_rate = Decimal()
 
-                        for drop_item, rate_str in location_data:
-                            if drop_item == 'Forma Blueprint':
-                                continue
+def get_expected_best(prices, cdfs, base):
+    # E[max] over the shared ascending price axis: each price times the jump
+    # of the CDF of the best reward at that price.
+    steps = np.diff(np.concatenate([base, cdfs], axis=-1), axis=-1)
+    return steps @ prices
 
-                            rate = get_rate(rate_str)
 
-                            cumulative_rate += rate
-                            
-                            if cumulative_rate > roll:
-                                price = get_drop_item_price(drop_item)
-                                if best_price is None or price > best_price:
-                                    best_price = price
+def get_squad_evs(table, num_players=1):
+    # Exact EV of the best reward when num_players each open the same relic.
+    cdfs, base = get_table_cdfs(table)
+    return get_expected_best(table['prices'], cdfs ** num_players, base ** num_players)
 
-                        if best_price is not None:
-                            actual_trials += 1
-                            total_value += Decimal(str(best_price))
 
-                return float(total_value) / actual_trials
+def get_relic_evs(table, refinement, num_players=1):
+    evs = get_squad_evs(table, num_players)
+    suffix = ' Relic ({})'.format(refinement)
+
+    return {
+        location[:-len(suffix)]: float(ev)
+        for location, ev in zip(table['locations'], evs)
+        if location.endswith(suffix)
+    }
+
+
+def get_daily_price_matrix(table):
+    # Daily medians of every drop item in the table, padded with zeros to the
+    # longest history. Items without any statistics keep one zero price.
+    daily_prices = [market.get_stats_daily_prices(market.get_stats(item)) or [0.0] for item in table['items']]
+
+    counts = np.array([len(prices) for prices in daily_prices])
+    matrix = np.zeros((len(daily_prices), counts.max(initial=1)))
+    for i, prices in enumerate(daily_prices):
+        matrix[i, :len(prices)] = prices
+
+    return matrix, counts
+
+
+def get_ev_bands(table, samples=1000, quantiles=(0.05, 0.5, 0.95), seed=None):
+    # Bootstrap every drop item's price from its daily medians at once, then
+    # value every location against every resampled price vector in one
+    # matrix product. Returns one row of EV quantiles per table location.
+    matrix, counts = get_daily_price_matrix(table)
+
+    rng = np.random.default_rng(seed)
+    days = (rng.random((len(counts), samples)) * counts[:, None]).astype(int)
+    price_samples = matrix[np.arange(len(counts))[:, None], days]
+
+    evs = table['rates'] @ price_samples
+    return np.quantile(evs, quantiles, axis=1).T
+
+
+def get_mixed_squad_ev(table, squad):
+    # squad is one (relic, refinement) per player. Rewards are independent, so
+    # the CDF of the best reward is the product of the per-player CDFs.
+    rows = [table['location_index'][get_location(relic, refinement)] for relic, refinement in squad]
+    cdfs, base = get_table_cdfs(table, rows)
+    return float(get_expected_best(table['prices'], cdfs.prod(axis=0), base.prod(axis=0)))
+
+
+def get_squads(counts, squad_size):
+    # Every multiset of squad_size indices, as sorted index rows, that takes
+    # index i at most counts[i] times. Rows are extended one column at a time;
+    # the trailing run length of a sorted row is how often its last index is
+    # used, so the count limit is checked as each column is added.
+    counts = np.asarray(counts)
+    num_choices = len(counts)
+
+    squads = np.flatnonzero(counts > 0).astype(np.int32).reshape(-1, 1)
+    runs = np.ones(len(squads), dtype=np.int32)
+    for _ in range(squad_size - 1):
+        last = squads[:, -1]
+        repeats = num_choices - last
+        parents = np.repeat(np.arange(len(squads)), repeats)
+        starts = np.cumsum(repeats) - repeats
+        column = last[parents] + (np.arange(len(parents)) - starts[parents]).astype(np.int32)
+
+        runs = np.where(column == last[parents], runs[parents] + 1, 1)
+        keep = runs <= counts[column]
+        squads = np.column_stack([squads[parents[keep]], column[keep]])
+        runs = runs[keep]
+
+    return squads
+
+
+def get_ranked_squads(table, inventory, squad_size=4, limit=None, chunk_size=4096):
+    # inventory maps (relic, refinement) to the number owned. Every multiset of
+    # squad_size relics the inventory can supply is valued, with the price axis
+    # restricted to the drop items those relics can give. Squads are generated
+    # one first relic at a time and only the best limit seen so far are kept,
+    # so memory is bounded by the squads sharing a first relic.
+    if squad_size < 1:
+        raise RuntimeError('Invalid squad size {}'.format(squad_size))
+
+    choices = sorted(choice for choice, count in inventory.items() if count > 0)
+    rows = [table['location_index'][get_location(relic, refinement)] for relic, refinement in choices]
+    if not rows:
+        return []
 
+    cdfs, base = get_table_cdfs(table, rows)
+    columns = np.flatnonzero(table['rates'][rows].any(axis=0))
+    cdfs = cdfs[:, columns]
+    prices = table['prices'][columns]
+
+    counts = np.array([inventory[choice] for choice in choices])
+
+    best_squads = np.empty((0, squad_size), dtype=np.int32)
+    best_evs = np.empty(0)
+    for first in range(len(choices)):
+        if squad_size == 1:
+            tails = np.empty((1, 0), dtype=np.int32)
+        else:
+            tail_counts = counts.copy()
+            tail_counts[:first] = 0
+            tail_counts[first] -= 1
+            tails = get_squads(tail_counts, squad_size - 1)
+        squads = np.column_stack([np.full(len(tails), first, dtype=np.int32), tails])
+
+        evs = np.empty(len(squads))
+        for start in range(0, len(squads), chunk_size):
+            chunk = squads[start:start + chunk_size]
+            evs[start:start + len(chunk)] = get_expected_best(prices, cdfs[chunk].prod(axis=1), base[chunk].prod(axis=1))
+
+        best_squads = np.concatenate([best_squads, squads])
+        best_evs = np.concatenate([best_evs, evs])
+        if limit is not None and limit < len(best_evs):
+            keep = np.argpartition(-best_evs, limit - 1)[:limit] if limit > 0 else np.empty(0, dtype=int)
+            best_squads = best_squads[keep]
+            best_evs = best_evs[keep]
+
+    order = np.argsort(-best_evs, kind='stable')
+
+    return [([choices[i] for i in best_squads[j]], float(best_evs[j])) for j in order]
+
+
+def main():
+    items = market.get_items()
+
+    current_relics = []
+
+    mission_drops = drops.get_missions()
+
+    for location, location_data in mission_drops:
+        for rotation, rotation_data in location_data:
+            for drop_item, rate in rotation_data:
+                if drop_item.endswith(' Relic'):
+                    current_relics.append(drop_item[:-len(' Relic')])
+
+    current_relics = sorted(set(current_relics))
+
+    relic_drops = drops.get_relics()
+    relic_data_by_location = get_relic_data_by_location(relic_drops)
+
+    run_timestamp = history.format_timestamp(datetime.utcnow())
+    history_rows = []
+
+    def add_history_rows(relic, squad_size, model, evs):
+        for refinement, value in zip(REFINEMENTS, evs):
+            history_rows.append({
+                'relic': relic,
+                'refinement': refinement,
+                'squad_size': squad_size,
+                'model': model,
+                'timestamp': run_timestamp,
+                'value': round(value, 2)
+            })
+
+    if not os.path.isdir('out/ev_relics'):
+        os.makedirs('out/ev_relics')
+
+    with metrics.span('relics.ev'), open('out/ev_relics/{}.txt'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
+        for relic in current_relics:
+            intact_location = relic + ' Relic (Intact)'
+            exceptional_location = relic + ' Relic (Exceptional)'
+            flawless_location = relic + ' Relic (Flawless)'
+            radiant_location = relic + ' Relic (Radiant)'
+
+            intact_ev = get_expected_value(relic_data_by_location, items, intact_location)
+            exceptional_ev = get_expected_value(relic_data_by_location, items, exceptional_location)
+            flawless_ev = get_expected_value(relic_data_by_location, items, flawless_location)
+            radiant_ev = get_expected_value(relic_data_by_location, items, radiant_location)
+
+            add_history_rows(relic, 1, 'ev', [intact_ev, exceptional_ev, flawless_ev, radiant_ev])
+
+            print('{} {:.2f} {:.2f} {:.2f} {:.2f}'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
+            f.write('{} {:.2f} {:.2f} {:.2f} {:.2f}\n'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
+
+    if not os.path.isdir('out/ev_mp4_relics'):
+        os.makedirs('out/ev_mp4_relics')
+
+    with metrics.span('relics.monte_carlo'), open('out/ev_mp4_relics/{}.txt'.format(datetime.now().strftime('%Y-%m-%dT%H.%M.%S')), 'w') as f:
+        for relic in current_relics:
             intact_location = relic + ' Relic (Intact)'
             exceptional_location = relic + ' Relic (Exceptional)'
             flawless_location = relic + ' Relic (Flawless)'
             radiant_location = relic + ' Relic (Radiant)'
 
-            intact_ev = get_multiplayer_ev(intact_location)
-            exceptional_ev = get_multiplayer_ev(exceptional_location)
-            flawless_ev = get_multiplayer_ev(flawless_location)
-            radiant_ev = get_multiplayer_ev(radiant_location)
+            intact_ev = get_multiplayer_ev(relic_data_by_location, items, intact_location)
+            exceptional_ev = get_multiplayer_ev(relic_data_by_location, items, exceptional_location)
+            flawless_ev = get_multiplayer_ev(relic_data_by_location, items, flawless_location)
+            radiant_ev = get_multiplayer_ev(relic_data_by_location, items, radiant_location)
+
+            add_history_rows(relic, 4, 'mc', [intact_ev, exceptional_ev, flawless_ev, radiant_ev])
 
             print('{} {:.2f} {:.2f} {:.2f} {:.2f}'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
             f.write('{} {:.2f} {:.2f} {:.2f} {:.2f}\n'.format(relic, intact_ev, exceptional_ev, flawless_ev, radiant_ev))
 
+    history.append_history(history_rows)
+
 
 if __name__ == '__main__':
     main()
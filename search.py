@@ -0,0 +1,164 @@
+import argparse
+import heapq
+import re
+
+
+def normalize(name):
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', name.lower()).split())
+
+
+def get_trigrams(name):
+    # Padding marks word starts so prefixes weigh more than inner matches.
+    padded = '  ' + normalize(name).replace(' ', '  ') + ' '
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# Trigrams found in at most this share of the names are looked up first;
+# common ones like "pri" or " bl" only when the rarer ones are not enough.
+COMMON_FRACTION = 0.02
+COMMON_MIN = 32
+
+
+def build_index(names):
+    names = sorted(set(names))
+
+    postings = {}
+    trigrams_by_name = []
+    for i, name in enumerate(names):
+        trigrams = get_trigrams(name)
+        trigrams_by_name.append(trigrams)
+        for trigram in trigrams:
+            postings.setdefault(trigram, []).append(i)
+
+    return {
+        'names': names,
+        'trigrams': trigrams_by_name,
+        'postings': postings
+    }
+
+
+def search(index, query, limit=5, min_score=0.0):
+    # Ranked by the Dice coefficient of the trigram sets. Candidates are the
+    # names sharing one of the rarest query trigrams. A name sharing only the
+    # u trigrams not looked up yet scores at most 2u / (len(trigrams) + u), so
+    # more are looked up while that bound could beat the best match. The best
+    # match is exact; the ones after it may miss names that share only common
+    # trigrams with the query.
+    trigrams = get_trigrams(query)
+    postings = index['postings']
+
+    known = sorted((trigram for trigram in trigrams if trigram in postings), key=lambda trigram: len(postings[trigram]))
+    if not known:
+        return []
+
+    cap = max(COMMON_MIN, int(len(index['names']) * COMMON_FRACTION))
+    used = max(1, sum(1 for trigram in known if len(postings[trigram]) <= cap))
+
+    trigrams_by_name = index['trigrams']
+    scores = {}
+    best = 0.0
+    for j, trigram in enumerate(known):
+        if j >= used:
+            remaining = len(known) - j
+            if 2 * remaining / (len(trigrams) + remaining) <= max(best, min_score):
+                break
+
+        for i in postings[trigram]:
+            if i not in scores:
+                score = 2 * len(trigrams & trigrams_by_name[i]) / (len(trigrams) + len(trigrams_by_name[i]))
+                scores[i] = score
+                if score > best:
+                    best = score
+
+    scored = ((score, i) for i, score in scores.items())
+    names = index['names']
+
+    return [(names[i], score) for score, i in heapq.nlargest(limit, scored) if score >= min_score]
+
+
+def get_not_found_message(index, drop_item, limit=3):
+    suggestions = search(index, drop_item, limit)
+    message = 'Could not find drop_item {}'.format(drop_item)
+    if suggestions:
+        message += ', did you mean {}'.format(', '.join(repr(name) for name, score in suggestions))
+    return message
+
+
+def check_missing(item_index, item_by_drop_item):
+    # Reports every name find_drop_items left as None in one error, each with
+    # its closest items. Aliases are only saved by the suggest and alias
+    # commands, never by a pricing run.
+    missing = sorted(drop_item for drop_item, item in item_by_drop_item.items() if item is None)
+    if missing:
+        index = build_index(item_index)
+        raise RuntimeError('; '.join(get_not_found_message(index, drop_item) for drop_item in missing))
+
+    return item_by_drop_item
+
+
+def get_drop_names(relic_drops):
+    return sorted(set(
+        drop_item
+        for location, location_data in relic_drops
+        for drop_item, rate_str in location_data
+        if drop_item != 'Forma Blueprint'
+    ))
+
+
+def get_unresolved(items, relic_drops):
+    import market
+
+    drop_names = get_drop_names(relic_drops)
+    item_by_drop_item = market.find_drop_items(market.get_item_index(items), drop_names)
+    return [drop_item for drop_item in drop_names if item_by_drop_item[drop_item] is None]
+
+
+def main():
+    import drops
+    import market
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query')
+    query_parser.add_argument('text')
+    query_parser.add_argument('--limit', type=int, default=10)
+
+    suggest_parser = subparsers.add_parser('suggest')
+    suggest_parser.add_argument('--accept', type=float, metavar='SCORE',
+                                help='save the best match as an alias when it scores at least SCORE')
+
+    alias_parser = subparsers.add_parser('alias')
+    alias_parser.add_argument('drop_item')
+    alias_parser.add_argument('item_name')
+
+    args = parser.parse_args()
+
+    items = market.get_items()
+    item_index = market.get_item_index(items)
+    index = build_index(item_index)
+
+    if args.command == 'query':
+        for name, score in search(build_index(list(item_index) + get_drop_names(drops.get_relics())), args.text, args.limit):
+            print('{:.2f} {}'.format(score, name))
+
+    elif args.command == 'suggest':
+        for drop_item in get_unresolved(items, drops.get_relics()):
+            matches = search(index, drop_item, 1)
+            if not matches:
+                print('{} -> ?'.format(drop_item))
+                continue
+
+            name, score = matches[0]
+            print('{} -> {} ({:.2f})'.format(drop_item, name, score))
+            if args.accept is not None and score >= args.accept:
+                market.save_alias(drop_item, name)
+
+    else:
+        if args.item_name not in item_index:
+            raise RuntimeError(get_not_found_message(index, args.item_name))
+        market.save_alias(args.drop_item, args.item_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+
+from tabulate import tabulate
+
+import drops
+import fmarket
+import market
+import relics
+
+
+def parse_inventory_args(inventory_args):
+    # Each argument is <relic>[:<refinement>[:<count>]], e.g. AA1:R:2 or N9.
+    # The relic part follows fmarket.parse_relic_args, including the relic
+    # type carrying over from the previous argument.
+    relic_args = []
+    refinements = []
+    counts = []
+
+    for inventory_arg in inventory_args:
+        parts = inventory_arg.split(':')
+        if len(parts) > 3:
+            raise RuntimeError('Invalid inventory entry')
+
+        refinement = 'Intact'
+        if len(parts) > 1:
+            matches = [r for r in relics.REFINEMENTS if r.upper().startswith(parts[1].upper())]
+            if not parts[1] or len(matches) != 1:
+                raise RuntimeError('Invalid refinement')
+            refinement = matches[0]
+
+        relic_args.append(parts[0])
+        refinements.append(refinement)
+        counts.append(int(parts[2]) if len(parts) > 2 else 1)
+
+    inventory = {}
+    for relic, refinement, count in zip(fmarket.parse_relic_args(relic_args), refinements, counts):
+        inventory[(relic, refinement)] = inventory.get((relic, refinement), 0) + count
+
+    return inventory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inventory', nargs='+')
+    parser.add_argument('--squad-size', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    inventory = parse_inventory_args(args.inventory)
+
+    relic_data_by_location = relics.get_relic_data_by_location(drops.get_relics())
+    table = relics.get_relic_table(relic_data_by_location, market.get_items())
+
+    rows = []
+    for squad, ev in relics.get_ranked_squads(table, inventory, args.squad_size, args.limit):
+        rows.append([', '.join('{} {}'.format(relic, refinement) for relic, refinement in squad), ev])
+
+    print(tabulate(rows, headers=['Squad', 'EV'], floatfmt='.2f'))
+
+
+if __name__ == '__main__':
+    main()
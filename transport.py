@@ -0,0 +1,132 @@
+import json
+import os
+import random
+import threading
+import time
+
+
+# live talks to the network, record also saves every response under the
+# recordings path, replay serves saved responses without any network access.
+MODE_ENV = 'WARFRAME_SS_TRANSPORT'
+
+PATH_ENV = 'WARFRAME_SS_TRANSPORT_PATH'
+
+LATENCY_ENV = 'WARFRAME_SS_TRANSPORT_LATENCY'
+
+ERROR_RATE_ENV = 'WARFRAME_SS_TRANSPORT_ERROR_RATE'
+
+MODES = ['live', 'record', 'replay']
+
+DEFAULT_PATH = 'transport'
+
+
+class TransportException(Exception):
+    pass
+
+
+mode = 'live'
+recordings_path = DEFAULT_PATH
+latency = 0.0
+error_rate = 0.0
+
+rng = random.Random()
+rng_lock = threading.Lock()
+
+
+def configure(new_mode='live', path=DEFAULT_PATH, new_latency=0.0, new_error_rate=0.0, seed=None):
+    global mode, recordings_path, latency, error_rate
+
+    if new_mode not in MODES:
+        raise TransportException('Invalid mode {}'.format(new_mode))
+
+    mode = new_mode
+    recordings_path = path
+    latency = new_latency
+    error_rate = new_error_rate
+    rng.seed(seed)
+
+
+def get_recording_path(url):
+    import hashlib
+
+    return os.path.join(recordings_path, hashlib.sha1(url.encode()).hexdigest())
+
+
+def save_response(url, response):
+    if not os.path.isdir(recordings_path):
+        os.makedirs(recordings_path)
+
+    path = get_recording_path(url)
+
+    with open(path + '.body', 'wb') as f:
+        f.write(response.content)
+
+    with open(path + '.json', 'w') as f:
+        json.dump({
+            'url': url,
+            'status_code': response.status_code,
+            'encoding': response.encoding,
+            'headers': dict(response.headers)
+        }, f, indent=2)
+
+
+def load_response(url):
+    import requests
+
+    path = get_recording_path(url)
+    if not os.path.isfile(path + '.json'):
+        raise TransportException('No recording for {}'.format(url))
+
+    with open(path + '.json') as f:
+        meta = json.load(f)
+
+    with open(path + '.body', 'rb') as f:
+        content = f.read()
+
+    response = requests.models.Response()
+    response.url = url
+    response.status_code = meta['status_code']
+    response.encoding = meta['encoding']
+    response.headers.update(meta['headers'])
+    response._content = content
+    response._content_consumed = True
+
+    return response
+
+
+def replay(url):
+    import requests
+
+    if latency:
+        time.sleep(latency)
+
+    with rng_lock:
+        failed = error_rate and rng.random() < error_rate
+    if failed:
+        raise requests.ConnectionError('Injected error for {}'.format(url))
+
+    return load_response(url)
+
+
+def get(url, **kwargs):
+    if mode == 'replay':
+        return replay(url)
+
+    # requests is imported on first use so cache-only runs never load it.
+    import requests
+
+    response = requests.get(url, **kwargs)
+
+    if mode == 'record':
+        save_response(url, response)
+
+    return response
+
+
+if os.environ.get(MODE_ENV):
+    configure(
+        os.environ[MODE_ENV],
+        os.environ.get(PATH_ENV, DEFAULT_PATH),
+        float(os.environ.get(LATENCY_ENV, 0.0)),
+        float(os.environ.get(ERROR_RATE_ENV, 0.0))
+    )